@@ -5,25 +5,44 @@ This function generates a DOCX invoice from the provided data using a template.
 
 import json
 import base64
+import concurrent.futures
+import copy
+import functools
 import io
 import os
 import re
+import hashlib
 import tempfile
+import time
 import zipfile
 from datetime import datetime
+from email.utils import formatdate
+from types import SimpleNamespace
 from urllib.request import urlopen, Request
-from urllib.error import URLError
+from urllib.error import HTTPError, URLError
+from xml.sax.saxutils import escape
 
-# Try to import python-docx
+# python-docx is imported on first use (see _load_docx) so CORS preflights and
+# rejected requests (405, 400) do not pay for its import on a cold start
+
+# Try to import urllib3 for pooled keep-alive connections
 try:
-    from docx import Document
-    from docx.shared import Pt, RGBColor, Inches
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-    from docx.oxml import parse_xml
-    from docx.oxml.ns import nsdecls, qn
-    DOCX_AVAILABLE = True
+    import urllib3
+    URLLIB3_AVAILABLE = True
+except ImportError:
+    URLLIB3_AVAILABLE = False
+
+# Try to import orjson for faster JSON encoding/decoding
+try:
+    import orjson
+    
+    _json_loads = orjson.loads
+    
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
 except ImportError:
-    DOCX_AVAILABLE = False
+    _json_loads = json.loads
+    _json_dumps = json.dumps
 
 # ================== CONFIGURATION ==================
 
@@ -35,8 +54,102 @@ TEMPLATE_URL = os.environ.get('INVOICE_TEMPLATE_URL', '')
 PAID_STAMP_URL = os.environ.get('PAID_STAMP_URL', 'https://drive.google.com/uc?export=download&id=1W9PL0DtP0TUk7IcGiMD_ZuLddtQ8gjNo')
 SIGNATURE_URL = os.environ.get('SIGNATURE_URL', 'https://drive.google.com/uc?export=download&id=1b6Dcg4spQmvLUMd4neBtLNfdr5l7QtPJ')
 
+# DOCX zip compression level - level 1 keeps saves fast; the parts are small
+# XML and the higher default level buys little on top of it
+DOCX_COMPRESSLEVEL = int(os.environ.get('DOCX_COMPRESSLEVEL', '1'))
+
+# Parts that are already compressed and are stored as-is in the DOCX zip
+PRECOMPRESSED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+# Template cache - warm invocations reuse the downloaded template instead of
+# fetching it again. /tmp survives between warm invocations of the same container.
+TEMPLATE_CACHE_TTL = int(os.environ.get('INVOICE_TEMPLATE_CACHE_TTL', '3600'))
+TEMPLATE_CACHE_PATH = os.path.join(
+    tempfile.gettempdir(),
+    f"invoice_template_{hashlib.sha1(TEMPLATE_URL.encode('utf-8')).hexdigest()[:12]}.docx"
+)
+
+# Shared connection pool - keeps TLS connections alive across warm invocations
+# for the template, paid stamp and signature downloads
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Connection': 'keep-alive'
+}
+_POOL = urllib3.PoolManager(
+    num_pools=2, maxsize=4, timeout=30,
+    # One attempt like urlopen, but still follow Drive's download redirects
+    retries=urllib3.Retry(total=None, connect=0, read=0, status=0, other=0, redirect=5)
+) if URLLIB3_AVAILABLE else None
+
+# Background worker - downloads the template while the handler parses the request
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+_TEMPLATE_CACHE = None
+_TEMPLATE_ETAG = None
+_TEMPLATE_FETCHED_AT = 0.0
+
+# Parsed template - deep-copied per request so the DOCX XML is only parsed
+# once per template download
+_PROTOTYPE_DOC = None
+_PROTOTYPE_SOURCE = None
+
 # ================== HELPER FUNCTIONS ==================
 
+@functools.lru_cache(maxsize=1)
+def _load_docx():
+    """
+    Import python-docx and build the objects derived from it, once per container.
+    Returns None if python-docx is not available.
+    """
+    try:
+        from docx import Document
+        from docx.shared import Pt, RGBColor
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls, qn
+    except ImportError:
+        return None
+    
+    # Private python-docx API: if it moves, keep the default compression
+    try:
+        from docx.opc.phys_pkg import _ZipPkgWriter
+        _ZipPkgWriter.__init__ = _zip_pkg_writer_init
+        _ZipPkgWriter.write = _zip_pkg_writer_write
+    except (ImportError, AttributeError) as e:
+        print(f"Warning: Could not set DOCX compression level ({str(e)})")
+    
+    w_nsdecls = nsdecls("w")
+    return SimpleNamespace(
+        Document=Document,
+        Pt=Pt,
+        WD_ALIGN_PARAGRAPH=WD_ALIGN_PARAGRAPH,
+        parse_xml=parse_xml,
+        W_NSDECLS=w_nsdecls,
+        # Resolved once rather than on every run/cell
+        EAST_ASIA=qn('w:eastAsia'),
+        W_R=qn('w:r'),
+        W_RPR=qn('w:rPr'),
+        W_RFONTS=qn('w:rFonts'),
+        W_ASCII=qn('w:ascii'),
+        W_HANSI=qn('w:hAnsi'),
+        THEME_FONT_ATTRS=tuple(qn(f'w:{name}') for name in ('asciiTheme', 'hAnsiTheme', 'eastAsiaTheme')),
+        W_T=qn('w:t'),
+        XML_SPACE='{http://www.w3.org/XML/1998/namespace}space',
+        W_TR=qn('w:tr'),
+        PT10=Pt(10),
+        LATE_FEE_COLOR=RGBColor.from_string('d95132'),
+        # Pre-parsed border elements, deep-copied per cell instead of re-parsed
+        WHITE_BORDER_ELEMS={
+            (side, sz): parse_xml(f'<w:{side} {w_nsdecls} w:val="single" w:sz="{sz}" w:space="0" w:color="FFFFFF"/>')
+            for side in ('top', 'bottom', 'left', 'right')
+            for sz in (4, 6)
+        },
+        TC_BORDERS_ELEM=parse_xml(f'<w:tcBorders {w_nsdecls}></w:tcBorders>'),
+    )
+
+# Swaps thousands/decimal separators to the Indonesian convention in one pass
+_CURRENCY_SWAP = str.maketrans({',': '.', '.': ','})
+
 def format_currency(amount):
     """Format amount as Indonesian Rupiah"""
     if amount == 0:
@@ -44,23 +157,31 @@ def format_currency(amount):
     elif amount == int(amount):
         return f"Rp {int(amount):,}".replace(',', '.')
     else:
-        return f"Rp {amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        return f"Rp {amount:,.2f}".translate(_CURRENCY_SWAP)
+
+# Characters that are invalid in file names, plus whitespace
+_FILENAME_RE = re.compile(r'[<>:"/\\|?*\s]')
 
 def sanitize_filename(name):
     """Remove or replace characters that are invalid in file names"""
-    return re.sub(r'[<>:"/\\|?*]', '_', name).replace(' ', '_')
+    return _FILENAME_RE.sub('_', name)
 
 def set_cell_border(cell, side, color="FFFFFF", sz=4):
     """Set border for a cell"""
+    dx = _load_docx()
     tc = cell._tc
     tcPr = tc.get_or_add_tcPr()
     side_mapping = {'top': 'top', 'bottom': 'bottom', 'left': 'left', 'right': 'right'}
     border_name = side_mapping.get(side.lower())
     if border_name:
-        border = parse_xml(f'<w:{border_name} {nsdecls("w")} w:val="single" w:sz="{sz}" w:space="0" w:color="{color}"/>')
+        cached = dx.WHITE_BORDER_ELEMS.get((border_name, sz)) if color == "FFFFFF" else None
+        if cached is not None:
+            border = copy.deepcopy(cached)
+        else:
+            border = dx.parse_xml(f'<w:{border_name} {dx.W_NSDECLS} w:val="single" w:sz="{sz}" w:space="0" w:color="{color}"/>')
         tcBorders = tcPr.first_child_found_in("w:tcBorders")
         if tcBorders is None:
-            tcBorders = parse_xml(f'<w:tcBorders {nsdecls("w")}></w:tcBorders>')
+            tcBorders = copy.deepcopy(dx.TC_BORDERS_ELEM)
             tcPr.append(tcBorders)
         tcBorders.append(border)
 
@@ -71,122 +192,381 @@ def set_white_borders(cell, sz=4):
 
 def set_cell_font(cell, font_name="Courier New", font_size=10):
     """Set font for all text in a cell"""
+    dx = _load_docx()
+    size = dx.PT10 if font_size == 10 else dx.Pt(font_size)
     for paragraph in cell.paragraphs:
         for run in paragraph.runs:
             run.font.name = font_name
-            run.font.size = Pt(font_size)
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-
-def apply_cell_style(cell, bg_color="ddefd5"):
-    """Apply styling to a cell"""
-    shading_elm = parse_xml(f'<w:shd {nsdecls("w")} w:fill="{bg_color}" />')
-    cell._tc.get_or_add_tcPr().append(shading_elm)
-    set_white_borders(cell, sz=6)
-    set_cell_font(cell)
+            run.font.size = size
+            run._element.rPr.rFonts.set(dx.EAST_ASIA, font_name)
 
-def replace_placeholders(doc, replacements):
-    """Replace placeholders in the document"""
-    for paragraph in doc.paragraphs:
-        for key, value in replacements.items():
-            if key in paragraph.text:
-                paragraph.text = paragraph.text.replace(key, str(value))
-    for table in doc.tables:
+def iter_all_paragraphs(doc, tables=None):
+    """Yield every paragraph in the document body and in its table cells"""
+    yield from doc.paragraphs
+    for table in (doc.tables if tables is None else tables):
         for row in table.rows:
             for cell in row.cells:
-                for key, value in replacements.items():
-                    if key in cell.text:
-                        cell.text = cell.text.replace(key, str(value))
+                yield from cell.paragraphs
+
+def set_default_font(doc, font_name="Courier New"):
+    """Make font_name the document-wide default run font (styles.xml docDefaults)"""
+    dx = _load_docx()
+    styles = doc.styles.element
+    rPr_list = styles.xpath('./w:docDefaults/w:rPrDefault/w:rPr')
+    if rPr_list:
+        rPr = rPr_list[0]
+    else:
+        doc_defaults = styles.xpath('./w:docDefaults')
+        if doc_defaults:
+            doc_defaults[0].insert(0, dx.parse_xml(f'<w:rPrDefault {dx.W_NSDECLS}><w:rPr/></w:rPrDefault>'))
+        else:
+            styles.insert(0, dx.parse_xml(
+                f'<w:docDefaults {dx.W_NSDECLS}><w:rPrDefault><w:rPr/></w:rPrDefault></w:docDefaults>'
+            ))
+        rPr = styles.xpath('./w:docDefaults/w:rPrDefault/w:rPr')[0]
+    
+    # Theme font attributes take precedence over explicit ones, so replace the whole element
+    for rFonts in rPr.findall(dx.W_RFONTS):
+        rPr.remove(rFonts)
+    rPr.insert(0, dx.parse_xml(
+        f'<w:rFonts {dx.W_NSDECLS} w:ascii="{font_name}" w:hAnsi="{font_name}" '
+        f'w:eastAsia="{font_name}" w:cs="{font_name}"/>'
+    ))
+
+def override_run_fonts(doc, font_name="Courier New"):
+    """
+    Put an explicit font_name w:rFonts on every run in the body. Paragraph and
+    character styles (Title, Heading 1, ...) carry theme fonts that beat
+    docDefaults, so the default alone is not enough.
+    """
+    dx = _load_docx()
+    for r in doc.element.body.iter(dx.W_R):
+        rFonts = r.get_or_add_rPr().get_or_add_rFonts()
+        # Theme attributes win over explicit font names, so drop them
+        for attr in dx.THEME_FONT_ATTRS:
+            rFonts.attrib.pop(attr, None)
+        rFonts.set(dx.W_ASCII, font_name)
+        rFonts.set(dx.W_HANSI, font_name)
+        rFonts.set(dx.EAST_ASIA, font_name)
+
+def _make_styled_run_xml(text, font_name="Courier New", size_pt=10, alignment=None):
+    """Build a <w:p> holding a single run with the invoice font (and alignment) applied"""
+    pPr = f'<w:pPr><w:jc w:val="{alignment}"/></w:pPr>' if alignment else ''
+    return (
+        f'<w:p>{pPr}<w:r><w:rPr>'
+        f'<w:rFonts w:ascii="{font_name}" w:hAnsi="{font_name}" w:eastAsia="{font_name}"/>'
+        f'<w:sz w:val="{size_pt * 2}"/>'
+        f'</w:rPr><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+    )
+
+_LINE_BREAK_RE = re.compile(r'\r\n|\n|\r')
+
+def _run_text_xml(text):
+    """
+    Escape text for the <w:t> of a run template, turning line breaks and tabs
+    into <w:br/> and <w:tab/> the way python-docx's text setters do.
+    """
+    return '</w:t><w:br/><w:t xml:space="preserve">'.join(
+        '</w:t><w:tab/><w:t xml:space="preserve">'.join(escape(part) for part in line.split('\t'))
+        for line in _LINE_BREAK_RE.split(text)
+    )
+
+# Item table columns: template field and paragraph alignment
+_ITEM_COLUMNS = (('desc', 'left'), ('price', 'right'), ('qty', 'center'), ('total', 'right'))
+
+@functools.lru_cache(maxsize=8)
+def _item_row_template(layout, bg_color="ddefd5", sz=6):
+    """
+    Build the <w:tr> format string for an item row with borders, shading, font
+    and alignment baked in. Fields: {desc}, {price}, {qty}, {total}.
+    layout holds one (width in twips or None, grid span) pair per column.
+    """
+    dx = _load_docx()
+    borders = ''.join(
+        f'<w:{side} w:val="single" w:sz="{sz}" w:space="0" w:color="FFFFFF"/>'
+        for side in ('top', 'bottom', 'left', 'right')
+    )
+    cells = []
+    for (field, alignment), (width, span) in zip(_ITEM_COLUMNS, layout):
+        tcW = f'<w:tcW w:type="dxa" w:w="{width}"/>' if width is not None else ''
+        gridSpan = f'<w:gridSpan w:val="{span}"/>' if span > 1 else ''
+        cells.append(
+            f'<w:tc><w:tcPr>{tcW}{gridSpan}<w:tcBorders>{borders}</w:tcBorders>'
+            f'<w:shd w:fill="{bg_color}"/></w:tcPr>{_make_styled_run_xml("{" + field + "}", alignment=alignment)}</w:tc>'
+        )
+    return f'<w:tr {dx.W_NSDECLS}>{"".join(cells)}</w:tr>'
+
+def _set_paragraph_text_preserving_run(paragraph, text):
+    """
+    Put text into the paragraph's first <w:t> and drop the other <w:t> elements,
+    so the existing runs (and their formatting) are kept instead of rebuilt.
+    Returns False when the runs hold more than plain text (tabs, breaks, ...).
+    """
+    dx = _load_docx()
+    runs = list(paragraph._p.iter(dx.W_R))
+    if not runs or any(child.tag not in (dx.W_RPR, dx.W_T) for r in runs for child in r):
+        return False
+    ts = [t for r in runs for t in r if t.tag == dx.W_T]
+    if not ts:
+        return False
+    first, rest = ts[0], ts[1:]
+    first.text = text
+    first.set(dx.XML_SPACE, 'preserve')
+    for t in rest:
+        t.getparent().remove(t)
+    return True
+
+# Characters python-docx maps to <w:br/>/<w:tab/> rather than <w:t> text
+_BREAK_CHARS_RE = re.compile(r'[\n\r\t]')
+
+def _substitute_in_paragraph(paragraph, pattern, repl):
+    """Replace placeholders in a paragraph without discarding its runs where possible"""
+    dx = _load_docx()
+    text = paragraph.text
+    
+    # Values with line breaks or tabs go through python-docx, which turns them
+    # into <w:br/>/<w:tab/> instead of raw characters inside <w:t>
+    if any(_BREAK_CHARS_RE.search(repl(match)) for match in pattern.finditer(text)):
+        paragraph.text = pattern.sub(repl, text)
+        return
+    
+    ts = list(paragraph._p.iter(dx.W_T))
+    joined = ''.join(t.text or '' for t in ts)
+    
+    # Every placeholder sits inside a single <w:t>: substitute in place
+    if sum(len(pattern.findall(t.text or '')) for t in ts) == len(pattern.findall(joined)):
+        for t in ts:
+            if t.text and pattern.search(t.text):
+                t.text = pattern.sub(repl, t.text)
+                t.set(dx.XML_SPACE, 'preserve')
+        return
+    
+    # A placeholder is split across runs: collapse the text into the first run
+    if not _set_paragraph_text_preserving_run(paragraph, pattern.sub(repl, text)):
+        paragraph.text = pattern.sub(repl, text)
+
+def replace_placeholders(doc, replacements, tables=None):
+    """Replace placeholders in the document"""
+    paragraphs = list(iter_all_paragraphs(doc, tables))
+    texts = [paragraph.text for paragraph in paragraphs]
+    
+    # Only keep placeholders that actually occur in the document
+    full_text = '\n'.join(texts)
+    active = {key: str(value) for key, value in replacements.items() if key and key in full_text}
+    if not active:
+        return doc
+    
+    # Longest keys first so a placeholder never shadows a longer one it prefixes
+    pattern = re.compile('|'.join(re.escape(key) for key in sorted(active, key=len, reverse=True)))
+    repl = lambda match: active[match.group(0)]
+    
+    for paragraph, text in zip(paragraphs, texts):
+        if pattern.search(text):
+            _substitute_in_paragraph(paragraph, pattern, repl)
     return doc
 
-def update_items_table(doc, items):
+def update_items_table(items_table, items):
     """Update the items table in the document"""
-    items_table = doc.tables[0]
+    dx = _load_docx()
     
     # Set borders for existing rows
-    for i in range(len(items_table.rows)):
-        for cell in items_table.rows[i].cells:
+    for row in items_table.rows:
+        for cell in row.cells:
             set_white_borders(cell, sz=6)
     
     # Remove all rows except header and placeholder
-    while len(items_table.rows) > 2:
-        items_table._tbl.remove(items_table.rows[2]._tr)
+    tbl = items_table._tbl
+    for tr in tbl.findall(dx.W_TR)[2:]:
+        tbl.remove(tr)
     
     placeholder_row = items_table.rows[1]
     
+    # One parse per item row from a pre-styled template instead of add_row() + per-cell styling.
+    # The new rows copy the placeholder row's cell layout (widths, merged grid columns).
+    placeholder_tcs = placeholder_row._tr.tc_lst
+    if len(placeholder_tcs) != len(_ITEM_COLUMNS):
+        raise ValueError(
+            f"Items table placeholder row must have {len(_ITEM_COLUMNS)} cells, found {len(placeholder_tcs)}"
+        )
+    grid_widths = [gridCol.w.twips if gridCol.w is not None else None
+                   for gridCol in tbl.tblGrid.gridCol_lst]
+    layout = []
+    grid_index = 0
+    for tc in placeholder_tcs:
+        span = tc.grid_span
+        width = tc.width.twips if tc.width is not None else None
+        if width is None:
+            spanned = grid_widths[grid_index:grid_index + span]
+            if len(spanned) == span and None not in spanned:
+                width = sum(spanned)
+        layout.append((width, span))
+        grid_index += span
+    row_template = _item_row_template(tuple(layout))
+    
     # Add items
     for item in items:
-        row = items_table.add_row()
-        row.cells[0].text = item['description']
-        row.cells[1].text = format_currency(item['unit_price'])
         quantity = item['quantity']
         if quantity == int(quantity):
-            row.cells[2].text = str(int(quantity))
+            quantity = str(int(quantity))
         else:
-            row.cells[2].text = str(quantity)
-        row.cells[3].text = format_currency(item['total'])
-        
-        # Apply styling
-        alignments = [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.RIGHT, 
-                     WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT]
-        for i, cell in enumerate(row.cells):
-            apply_cell_style(cell)
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = alignments[i]
+            quantity = str(quantity)
+        tr = dx.parse_xml(row_template.format(
+            desc=_run_text_xml(item['description']),
+            price=_run_text_xml(format_currency(item['unit_price'])),
+            qty=_run_text_xml(quantity),
+            total=_run_text_xml(format_currency(item['total']))
+        ))
+        tbl.append(tr)
     
     # Remove placeholder row
     items_table._tbl.remove(placeholder_row._tr)
     
-    return doc
+    return items_table
 
-def style_financial_table(doc, apply_late_fee):
+def style_financial_table(financial_table, apply_late_fee):
     """Style the financial summary table"""
-    financial_table = doc.tables[1]
+    dx = _load_docx()
     for row in financial_table.rows:
         for cell in row.cells:
             set_white_borders(cell)
             set_cell_font(cell)
         for paragraph in row.cells[1].paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+            paragraph.alignment = dx.WD_ALIGN_PARAGRAPH.RIGHT
     
     if apply_late_fee:
         late_fee_cell = financial_table.rows[3].cells[0]
         if "LATE FEE" in late_fee_cell.text:
-            original_text = late_fee_cell.text
-            late_fee_cell.text = ""
-            paragraph = late_fee_cell.paragraphs[0]
-            run = paragraph.add_run(original_text)
-            run.font.color.rgb = RGBColor.from_string('d95132')
-            run.font.name = "Courier New"
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "Courier New")
+            # Colour the existing runs rather than rebuilding the cell text
+            for paragraph in late_fee_cell.paragraphs:
+                for run in paragraph.runs:
+                    run.font.color.rgb = dx.LATE_FEE_COLOR
+
+def _zip_pkg_writer_init(self, pkg_file):
+    """Open the DOCX zip with the configured compression level"""
+    self._zipf = zipfile.ZipFile(pkg_file, 'w', compression=zipfile.ZIP_DEFLATED,
+                                 compresslevel=DOCX_COMPRESSLEVEL)
+
+def _zip_pkg_writer_write(self, pack_uri, blob):
+    """Write a part to the DOCX zip, storing already-compressed media uncompressed"""
+    compress_type = zipfile.ZIP_STORED if pack_uri.ext.lower() in PRECOMPRESSED_EXTENSIONS else None
+    self._zipf.writestr(pack_uri.membername, blob, compress_type=compress_type)
+
+def _write_template_cache(data):
+    """Atomically write the template bytes to the /tmp cache file"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(TEMPLATE_CACHE_PATH), suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, TEMPLATE_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not cache template ({str(e)})")
+
+def fetch_url(url, headers=None):
+    """GET a URL, returning (status, response headers, body)"""
+    headers = {**HTTP_HEADERS, **(headers or {})}
+    
+    if _POOL is not None:
+        try:
+            response = _POOL.request('GET', url, headers=headers, preload_content=False)
+            try:
+                return response.status, response.headers, response.read()
+            finally:
+                response.release_conn()
+        except urllib3.exceptions.HTTPError as e:
+            raise Exception(f"Failed to download {url}: {str(e)}")
+    
+    request = Request(url, headers=headers)
+    try:
+        with urlopen(request, timeout=30) as response:
+            # file:// responses carry no status code
+            return response.status or 200, response.headers, response.read()
+    except HTTPError as e:
+        return e.code, e.headers, b''
+    except URLError as e:
+        raise Exception(f"Failed to download {url}: {str(e)}")
+
+def template_cache_fresh():
+    """Whether the in-memory template copy can be used without a download"""
+    return _TEMPLATE_CACHE is not None and time.time() - _TEMPLATE_FETCHED_AT < TEMPLATE_CACHE_TTL
 
 def download_template():
-    """Download the invoice template from URL"""
+    """Download the invoice template from URL, reusing the cached copy while fresh"""
+    global _TEMPLATE_CACHE, _TEMPLATE_ETAG, _TEMPLATE_FETCHED_AT
+    
     if not TEMPLATE_URL:
         raise ValueError("INVOICE_TEMPLATE_URL environment variable not set")
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    request = Request(TEMPLATE_URL, headers=headers)
+    now = time.time()
+    
+    # Cold start: pick up the copy a previous invocation left in /tmp
+    if _TEMPLATE_CACHE is None and os.path.exists(TEMPLATE_CACHE_PATH):
+        try:
+            with open(TEMPLATE_CACHE_PATH, 'rb') as f:
+                _TEMPLATE_CACHE = f.read()
+            _TEMPLATE_FETCHED_AT = os.path.getmtime(TEMPLATE_CACHE_PATH)
+        except OSError:
+            _TEMPLATE_CACHE = None
+    
+    if _TEMPLATE_CACHE is not None and now - _TEMPLATE_FETCHED_AT < TEMPLATE_CACHE_TTL:
+        return io.BytesIO(_TEMPLATE_CACHE)
+    
+    headers = {}
+    # Revalidate a stale copy so an unchanged template is answered with 304
+    if _TEMPLATE_CACHE is not None:
+        if _TEMPLATE_ETAG:
+            headers['If-None-Match'] = _TEMPLATE_ETAG
+        headers['If-Modified-Since'] = formatdate(_TEMPLATE_FETCHED_AT, usegmt=True)
     
     try:
-        with urlopen(request, timeout=30) as response:
-            return io.BytesIO(response.read())
-    except URLError as e:
-        raise Exception(f"Failed to download template: {str(e)}")
+        status, response_headers, data = fetch_url(TEMPLATE_URL, headers)
+        if status == 304 and _TEMPLATE_CACHE is not None:
+            _TEMPLATE_FETCHED_AT = now
+            try:
+                os.utime(TEMPLATE_CACHE_PATH, (now, now))
+            except OSError:
+                pass
+            return io.BytesIO(_TEMPLATE_CACHE)
+        if status != 200:
+            raise Exception(f"Failed to download template: HTTP {status}")
+    except Exception as e:
+        # Serve the stale copy rather than fall back to the embedded template
+        if _TEMPLATE_CACHE is None:
+            raise
+        print(f"Warning: Could not refresh template ({str(e)}), using cached copy")
+        return io.BytesIO(_TEMPLATE_CACHE)
+    etag = response_headers.get('ETag')
+    
+    _TEMPLATE_CACHE = data
+    _TEMPLATE_ETAG = etag
+    _TEMPLATE_FETCHED_AT = now
+    _write_template_cache(data)
+    return io.BytesIO(data)
+
+def load_template_document(template_data=None):
+    """Return a fresh copy of the parsed invoice template"""
+    global _PROTOTYPE_DOC, _PROTOTYPE_SOURCE
+    
+    dx = _load_docx()
+    if template_data is None:
+        template_data = download_template()
+    if _PROTOTYPE_DOC is None or _PROTOTYPE_SOURCE is not _TEMPLATE_CACHE:
+        _PROTOTYPE_DOC = dx.Document(template_data)
+        _PROTOTYPE_SOURCE = _TEMPLATE_CACHE
+    return copy.deepcopy(_PROTOTYPE_DOC)
 
 def create_embedded_template():
     """
     Create a basic invoice template if no template URL is provided.
     This is a fallback option.
     """
-    doc = Document()
+    dx = _load_docx()
+    doc = dx.Document()
     
     # Add company header
     header = doc.add_paragraph()
     header_run = header.add_run("INVOICE")
     header_run.bold = True
-    header_run.font.size = Pt(24)
+    header_run.font.size = dx.Pt(24)
     
     # Add placeholder paragraphs
     doc.add_paragraph("From: Marketix Lab")
@@ -247,13 +627,16 @@ def create_embedded_template():
     
     return doc
 
-def generate_invoice(data):
-    """Generate the invoice document"""
+def generate_invoice(data, template_future=None):
+    """
+    Generate the invoice document.
+    template_future, if given, resolves to the already-downloaded template.
+    """
     # Try to download template, fall back to embedded template
     try:
         if TEMPLATE_URL:
-            template_data = download_template()
-            doc = Document(template_data)
+            template_data = template_future.result() if template_future is not None else None
+            doc = load_template_document(template_data)
         else:
             doc = create_embedded_template()
     except Exception as e:
@@ -274,30 +657,32 @@ def generate_invoice(data):
         replacements['{{LATE FEE:}}'] = ''
         replacements['[latefee]'] = ''
     
+    # Courier New as the document default font
+    set_default_font(doc)
+    
+    # Resolve the tables once; each doc.tables access re-queries the body
+    tables = doc.tables
+    
     # Replace placeholders
-    doc = replace_placeholders(doc, replacements)
+    doc = replace_placeholders(doc, replacements, tables)
     
     # Update items table
     items = data.get('items', [])
     if items:
-        doc = update_items_table(doc, items)
+        update_items_table(tables[0], items)
     
     # Style financial table
     try:
-        style_financial_table(doc, data.get('apply_late_fee', False))
+        style_financial_table(tables[1], data.get('apply_late_fee', False))
     except Exception as e:
         print(f"Warning: Could not style financial table: {str(e)}")
     
-    # Apply font to all paragraphs
-    for paragraph in doc.paragraphs:
-        for run in paragraph.runs:
-            run.font.name = "Courier New"
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "Courier New")
+    # Runs in styled paragraphs or with their own font would not pick up the default
+    override_run_fonts(doc)
     
     # Generate output
     output = io.BytesIO()
     doc.save(output)
-    output.seek(0)
     
     # Generate filename
     client_name = data.get('client_info', {}).get('{{client_name}}', 'Client')
@@ -306,7 +691,8 @@ def generate_invoice(data):
     prefix = "Paid_Invoice" if data.get('mark_as_paid', False) else "Invoice"
     filename = f"{prefix}_{invoice_number}_{client_name}.docx"
     
-    return output.getvalue(), filename
+    # Hand back a view of the buffer rather than a copy of the bytes
+    return output.getbuffer(), filename
 
 # ================== NETLIFY HANDLER ==================
 
@@ -333,19 +719,14 @@ def handler(event, context):
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': _json_dumps({'error': 'Method not allowed'})
         }
     
-    # Check if python-docx is available
-    if not DOCX_AVAILABLE:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'python-docx library not available'})
-        }
+    # Start the template download so it overlaps with parsing the request
+    # and importing python-docx
+    template_future = None
+    if TEMPLATE_URL and not template_cache_fresh():
+        template_future = _EXECUTOR.submit(download_template)
     
     try:
         # Parse request body
@@ -353,7 +734,7 @@ def handler(event, context):
         if event.get('isBase64Encoded', False):
             body = base64.b64decode(body).decode('utf-8')
         
-        data = json.loads(body)
+        data = _json_loads(body)
         
         # Validate required fields
         required_fields = ['client_info', 'invoice_details', 'items', 'financials']
@@ -365,11 +746,22 @@ def handler(event, context):
                         'Access-Control-Allow-Origin': '*',
                         'Content-Type': 'application/json'
                     },
-                    'body': json.dumps({'error': f'Missing required field: {field}'})
+                    'body': _json_dumps({'error': f'Missing required field: {field}'})
                 }
         
+        # Check if python-docx is available
+        if _load_docx() is None:
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': _json_dumps({'error': 'python-docx library not available'})
+            }
+        
         # Generate invoice
-        docx_bytes, filename = generate_invoice(data)
+        docx_bytes, filename = generate_invoice(data, template_future)
         
         # Return the DOCX file as base64
         return {
@@ -379,18 +771,18 @@ def handler(event, context):
                 'Content-Type': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
                 'Content-Disposition': f'attachment; filename="{filename}"'
             },
-            'body': base64.b64encode(docx_bytes).decode('utf-8'),
+            'body': base64.b64encode(docx_bytes).decode('ascii'),
             'isBase64Encoded': True
         }
         
-    except json.JSONDecodeError:
+    except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses this
         return {
             'statusCode': 400,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({'error': 'Invalid JSON in request body'})
+            'body': _json_dumps({'error': 'Invalid JSON in request body'})
         }
     except Exception as e:
         return {
@@ -399,5 +791,5 @@ def handler(event, context):
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({'error': str(e)})
+            'body': _json_dumps({'error': str(e)})
         }